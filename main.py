@@ -4,12 +4,25 @@ Includes order-book volume depth validation for a given investment amount.
 Designed to be GitHub-ready and easy to run locally, on Streamlit Cloud, or Colab.
 """
 
+import csv
+import heapq
+import operator
 import time
-import ccxt
+import asyncio
+import aiohttp
+import ccxt.async_support as ccxta
 import math
-import pandas as pd
+import numpy as np
+from collections import Counter, defaultdict
+from itertools import chain, combinations, islice
+from cachetools import TTLCache
 from typing import Dict, List, Tuple
 
+try:
+    from numba import njit
+except ImportError:  # optional: fills fall back to the NumPy vectorized versions
+    njit = None
+
 # ============ CONFIG ============
 DEFAULT_EXCHANGES = ["kucoin", "bybit", "okx", "binance"]  # sensible defaults for first runs
 # You can pass other exchange ids supported by ccxt; beware of rate limits.
@@ -17,60 +30,190 @@ MAX_MARKETS_PER_EXCHANGE = 500   # limit markets loaded per exchange for speed
 ORDERBOOK_DEPTH_LEVELS = 10      # number of levels to fetch for depth checks
 ESTIMATED_FEE_PCT = 0.2          # estimated round-trip fee percent (adjust for your exchanges)
 MIN_PROFIT_PCT = 0.25            # minimum profit percent to surface
+MAX_CYCLE_LEGS = 4               # longest cycle (number of trades) the triangular/multi-leg scan reports
 INVESTMENT_AMOUNT = 1000.0       # amount in quote currency to test liquidity (e.g., USDT)
+ORDERBOOK_CACHE_TTL = 3.0        # seconds an order book is reused before refetching
+TICKER_CACHE_TTL = 5.0           # seconds a ticker is reused before refetching
+MAX_FETCH_RETRIES = 3            # retries on rate-limit errors, with exponential backoff (1s, 2s, 4s)
+TICKER_PREFILTER_SLACK_PCT = 0.1 # cross-exchange prefilter tolerance below MIN_PROFIT_PCT + fee (tickers can lag books)
 # =================================
 
-def init_exchange(name: str, enable_rate_limit: bool = True) -> ccxt.Exchange:
-    cls = getattr(ccxt, name)
-    return cls({'enableRateLimit': enable_rate_limit})
+# process-wide caches of in-flight/finished fetches, keyed by (id(exchange), symbol[, depth])
+_order_book_cache = TTLCache(maxsize=4096, ttl=ORDERBOOK_CACHE_TTL)
+_ticker_cache = TTLCache(maxsize=4096, ttl=TICKER_CACHE_TTL)
+
+def _cached_fetch(cache: TTLCache, key: tuple, fetch) -> asyncio.Future:
+    """
+    Return the fetch stored under key, starting fetch() as a task on a miss.
+    Callers asking for the same key within the TTL share one request, even while it is still in flight.
+    """
+    task = cache.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        cache[key] = task
+    return task
+
+# per-exchange concurrency limits, keyed by id(exchange)
+_semaphores: Dict[int, asyncio.Semaphore] = {}
+
+def _exchange_semaphore(exchange: ccxta.Exchange) -> asyncio.Semaphore:
+    """
+    Semaphore bounding in-flight requests to one exchange, sized to its request rate (rateLimit is ms per request).
+    """
+    sem = _semaphores.get(id(exchange))
+    if sem is None:
+        sem = asyncio.Semaphore(max(2, int(1000 / (exchange.rateLimit or 1000))))
+        _semaphores[id(exchange)] = sem
+    return sem
+
+async def _throttled(exchange: ccxta.Exchange, method: str, *args, **kwargs):
+    """
+    Call exchange.<method>(*args, **kwargs) while holding the exchange's semaphore, retrying with exponential
+    backoff when the venue signals rate limiting. Other errors propagate to the safe_* wrappers.
+    """
+    for attempt in range(MAX_FETCH_RETRIES + 1):
+        try:
+            async with _exchange_semaphore(exchange):
+                return await getattr(exchange, method)(*args, **kwargs)
+        except (ccxta.RateLimitExceeded, ccxta.DDoSProtection):
+            if attempt == MAX_FETCH_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+def init_exchange(name: str, enable_rate_limit: bool = True, session: aiohttp.ClientSession = None) -> ccxta.Exchange:
+    cls = getattr(ccxta, name)
+    config = {'enableRateLimit': enable_rate_limit}
+    if session is not None:
+        # ccxt leaves an injected session open on close(); its owner closes it
+        config['session'] = session
+    return cls(config)
 
-def safe_load_markets(exchange: ccxt.Exchange, limit: int = 500) -> Dict[str, dict]:
+async def safe_load_markets(exchange: ccxta.Exchange, limit: int = 500) -> Dict[str, dict]:
     try:
-        markets = exchange.load_markets()
-        items = list(markets.items())[:limit]
-        return {k: v for k, v in items}
+        markets = await _throttled(exchange, 'load_markets')
+        return dict(islice(markets.items(), limit))
     except Exception as e:
         print(f"[warn] load_markets {getattr(exchange,'id',str(exchange))}: {e}")
         return {}
 
-def safe_fetch_ticker(exchange: ccxt.Exchange, symbol: str):
+async def _fetch_ticker(exchange: ccxta.Exchange, symbol: str):
+    try:
+        return await _throttled(exchange, 'fetch_ticker', symbol)
+    except Exception as e:
+        return None
+
+async def safe_fetch_ticker(exchange: ccxta.Exchange, symbol: str):
+    return await _cached_fetch(_ticker_cache, (id(exchange), symbol),
+                               lambda: _fetch_ticker(exchange, symbol))
+
+async def safe_fetch_tickers(exchange: ccxta.Exchange, symbols: List[str]):
     try:
-        return exchange.fetch_ticker(symbol)
+        return await _throttled(exchange, 'fetch_tickers', symbols) or {}
     except Exception as e:
+        print(f"[warn] fetch_tickers {getattr(exchange,'id',str(exchange))}: {e}; falling back to per-symbol tickers")
         return None
 
-def safe_fetch_order_book(exchange: ccxt.Exchange, symbol: str, depth: int = 10):
+async def _fetch_order_book(exchange: ccxta.Exchange, symbol: str, depth: int):
     try:
-        return exchange.fetch_order_book(symbol, depth)
+        ob = await _throttled(exchange, 'fetch_order_book', symbol, limit=depth)
+        # parse both sides into float64 arrays once, here, for every fill computation on this book;
+        # slicing to depth also covers exchanges that ignore limit. Malformed levels count as a failed fetch.
+        ob['_asks_np'] = _levels_array(ob.get('asks') or [], depth)
+        ob['_bids_np'] = _levels_array(ob.get('bids') or [], depth)
+        return ob
     except Exception as e:
         return None
 
-def compute_fillable_base_amount_from_asks(order_book: dict, max_quote: float) -> float:
+async def safe_fetch_order_book(exchange: ccxta.Exchange, symbol: str, depth: int = 10):
+    return await _cached_fetch(_order_book_cache, (id(exchange), symbol, depth),
+                               lambda: _fetch_order_book(exchange, symbol, depth))
+
+def _levels_array(levels: list, depth: int = None) -> np.ndarray:
     """
-    Given order_book asks [[price, amount], ...] and a maximum quote currency amount (e.g., USDT),
-    compute how many base units you can buy with up to max_quote across depth levels.
-    Returns base_amount that can be acquired.
+    Convert order-book levels [[price, amount, ...], ...] (first depth rows) into a (levels, 2) float64
+    array of [price, amount], dropping non-positive prices.
     """
-    if not order_book or 'asks' not in order_book: 
-        return 0.0
+    arr = np.asarray(levels[:depth], dtype=np.float64)
+    if arr.ndim != 2:
+        return np.empty((0, 2), dtype=np.float64)
+    arr = arr[:, :2]
+    return arr[arr[:, 0] > 0]
+
+def _book_side(order_book: dict, side: str) -> np.ndarray:
+    """
+    Return one side of order_book ('asks' or 'bids') as the array built by _levels_array.
+    Books from safe_fetch_order_book carry it already; other books get it built once and kept on them.
+    """
+    key = f"_{side}_np"
+    levels = order_book.get(key)
+    if levels is None:
+        levels = order_book[key] = _levels_array(order_book[side])
+    return levels
+
+def _fill_base_vectorized(asks: np.ndarray, max_quote: float) -> float:
+    prices, amounts = asks[:, 0], asks[:, 1]
+    cum_cost = np.cumsum(prices * amounts)
+    # number of levels that can be taken whole; the next one is filled partially
+    k = int(np.searchsorted(cum_cost, max_quote + 1e-12, side='right'))
+    if k >= len(prices):
+        return float(amounts.sum())
+    spent = cum_cost[k-1] if k > 0 else 0.0
+    return float(amounts[:k].sum() + (max_quote - spent) / prices[k])
+
+def _fill_quote_vectorized(bids: np.ndarray, max_base: float) -> float:
+    prices, amounts = bids[:, 0], bids[:, 1]
+    cum_amount = np.cumsum(amounts)
+    # number of levels that can be sold into whole; the next one is filled partially
+    k = int(np.searchsorted(cum_amount, max_base + 1e-12, side='right'))
+    if k >= len(prices):
+        return float(prices @ amounts)
+    sold = cum_amount[k-1] if k > 0 else 0.0
+    return float(prices[:k] @ amounts[:k] + prices[k] * (max_base - sold))
+
+def _fill_base_loop(asks: np.ndarray, max_quote: float) -> float:
     remaining_quote = max_quote
     base_acquired = 0.0
-    for level in order_book['asks']:
-        price, amount = level[0], level[1]
-        if price <= 0:
-            continue
-        cost = price * amount
+    for i in range(asks.shape[0]):
+        cost = asks[i, 0] * asks[i, 1]
         if cost <= remaining_quote + 1e-12:
-            base_acquired += amount
+            base_acquired += asks[i, 1]
             remaining_quote -= cost
         else:
             # partial fill at this level
-            fill_amount = remaining_quote / price
-            base_acquired += fill_amount
-            remaining_quote = 0.0
-            break
+            return base_acquired + remaining_quote / asks[i, 0]
     return base_acquired
 
+def _fill_quote_loop(bids: np.ndarray, max_base: float) -> float:
+    remaining_base = max_base
+    quote_received = 0.0
+    for i in range(bids.shape[0]):
+        if bids[i, 1] <= remaining_base + 1e-12:
+            quote_received += bids[i, 0] * bids[i, 1]
+            remaining_base -= bids[i, 1]
+        else:
+            # partial fill
+            return quote_received + bids[i, 0] * remaining_base
+    return quote_received
+
+# On ~10-level books a compiled level walk beats cumsum (no temporary arrays), but it is only
+# fast when compiled; without numba the vectorized versions are used instead.
+if njit is not None:
+    _fill_base = njit(cache=True, fastmath=True)(_fill_base_loop)
+    _fill_quote = njit(cache=True, fastmath=True)(_fill_quote_loop)
+else:
+    _fill_base = _fill_base_vectorized
+    _fill_quote = _fill_quote_vectorized
+
+def compute_fillable_base_amount_from_asks(order_book: dict, max_quote: float) -> float:
+    """
+    Given order_book asks [[price, amount], ...] and a maximum quote currency amount (e.g., USDT),
+    compute how many base units you can buy with up to max_quote across depth levels.
+    Returns base_amount that can be acquired.
+    """
+    if not order_book or 'asks' not in order_book: 
+        return 0.0
+    return float(_fill_base(_book_side(order_book, 'asks'), float(max_quote)))
+
 def compute_fillable_quote_amount_from_bids(order_book: dict, max_base: float) -> float:
     """
     Given order_book bids [[price, amount], ...] and a maximum base amount to sell,
@@ -79,30 +222,14 @@ def compute_fillable_quote_amount_from_bids(order_book: dict, max_base: float) -
     """
     if not order_book or 'bids' not in order_book:
         return 0.0
-    remaining_base = max_base
-    quote_received = 0.0
-    for level in order_book['bids']:
-        price, amount = level[0], level[1]
-        if price <= 0:
-            continue
-        if amount <= remaining_base + 1e-12:
-            quote_received += price * amount
-            remaining_base -= amount
-        else:
-            # partial fill
-            fill_amount = remaining_base
-            quote_received += price * fill_amount
-            remaining_base = 0.0
-            break
-    return quote_received
+    return float(_fill_quote(_book_side(order_book, 'bids'), float(max_base)))
 
-def check_cross_exchange_liquidity(buy_ex, sell_ex, symbol: str, investment_quote: float, depth_levels: int = 10) -> Tuple[bool, float]:
+def check_cross_exchange_liquidity(ob_buy: dict, ob_sell: dict, investment_quote: float) -> Tuple[bool, float]:
     """
-    Check if buying on buy_ex and selling on sell_ex for 'symbol' is feasible with investment_quote amount.
+    Check if buying into ob_buy's asks and selling into ob_sell's bids is feasible with investment_quote amount.
+    Both order books are already fetched (same symbol on two exchanges); no network calls happen here.
     Returns (feasible, expected_profit_percent_after_fees)
     """
-    ob_buy = safe_fetch_order_book(buy_ex, symbol, depth_levels)
-    ob_sell = safe_fetch_order_book(sell_ex, symbol, depth_levels)
     if not ob_buy or not ob_sell:
         return (False, 0.0)
     # How much base can we buy on buy_ex with investment_quote?
@@ -117,181 +244,404 @@ def check_cross_exchange_liquidity(buy_ex, sell_ex, symbol: str, investment_quot
     profit_pct = (gross - 1.0) * 100.0 - ESTIMATED_FEE_PCT
     return (profit_pct >= MIN_PROFIT_PCT, profit_pct)
 
-def simulate_triangular_with_depth(exchange: ccxt.Exchange, route: Tuple[str,str,str], investment_quote: float, depth_levels: int=10) -> Tuple[bool, float]:
+def _convert_leg(order_book: dict, pair: Tuple[str, str], held: str, amount: float) -> Tuple[str, float]:
+    """
+    Convert amount of currency held across one market whose (base, quote) is pair, using its order book.
+    Holding the base sells into the bids, holding the quote buys from the asks.
+    Returns (currency_received, amount_received), or (None, 0.0) if the market does not trade held.
     """
-    Simulate a triangular route A/B, B/C, C/A where route is (s1, s2, s3) symbol strings.
-    We'll attempt to simulate order execution using order books and return (feasible, profit_pct).
+    base, quote = pair
+    if held == base:
+        return quote, compute_fillable_quote_amount_from_bids(order_book, amount)
+    if held == quote:
+        return base, compute_fillable_base_amount_from_asks(order_book, amount)
+    return None, 0.0
+
+async def simulate_triangular_with_depth(exchange: ccxta.Exchange, route: Tuple[str, ...], start: str,
+                                         pair_info: Dict[str, Tuple[str, str]], investment_quote: float,
+                                         depth_levels: int=10) -> Tuple[bool, float]:
+    """
+    Simulate a cyclic route over symbols (s1, s2, s3[, ...]), starting with investment_quote units of start.
+    Each leg is executed against its order book in whichever orientation the market is listed (pair_info maps
+    symbol -> (base, quote) from load_markets), and the route must end back in start. Returns (feasible, profit_pct).
     The simulation uses conservative depth-based fill estimates.
     """
-    s1, s2, s3 = route
-    # Step 1: spend investment_quote on s1 (buy base1 using quote1)
-    ob1 = safe_fetch_order_book(exchange, s1, depth_levels)
-    if not ob1:
-        return (False, 0.0)
-    # determine which side is base/quote
-    base1, quote1 = s1.split('/')
-    # for s1 we assume we buy base1 using quote1 (use asks)
-    base1_acquired = compute_fillable_base_amount_from_asks(ob1, investment_quote)
-    if base1_acquired <= 0:
-        return (False, 0.0)
-    # Step 2: exchange base1 -> base2 across s2 (which may be base2/quote2)
-    ob2 = safe_fetch_order_book(exchange, s2, depth_levels)
-    if not ob2:
-        return (False, 0.0)
-    base2, quote2 = s2.split('/')
-    # Determine how much of base2 we can get by selling base1 (we may need to sell base1 as bids on s2 if base1==quote2 or other mapping).
-    # For simplicity, we will attempt common pattern where s2 = base1/quoteX or quoteX/base1; try both directions.
-    # Approach: convert base1_acquired into quote via matching symbol direction then into next base
-    # We'll implement a conservative heuristic: use mid prices for conversion but validate depth for the main legs.
-    # Sell base1_acquired on s2's bids to get quote (if base1 is the base of s2)
-    quote_after_s2 = None
-    # try if s2 is base1/quote2 => selling base1 on bids yields quote2
-    if s2 == f"{base1}/{quote2}":
-        quote_after_s2 = compute_fillable_quote_amount_from_bids(ob2, base1_acquired)
-    elif s2 == f"{quote2}/{base1}":
-        # more complex mapping; skip conservative simulation
-        quote_after_s2 = None
-    if quote_after_s2 is None or quote_after_s2 <= 0:
-        return (False, 0.0)
-    # Step 3: use quote_after_s2 to buy the final asset via s3 and then sell back to original quote; for conservative sim, we'll assume final conversion yields mid price and check depth on s3.
-    ob3 = safe_fetch_order_book(exchange, s3, depth_levels)
-    if not ob3:
-        return (False, 0.0)
-    try:
-        top_bid = ob3.get('bids')[0][0] if ob3.get('bids') else None
-        top_ask = ob3.get('asks')[0][0] if ob3.get('asks') else None
-        if not top_bid or not top_ask:
+    held, amount = start, investment_quote
+    for symbol in route:
+        ob = await safe_fetch_order_book(exchange, symbol, depth_levels)
+        if not ob:
             return (False, 0.0)
-        mid = (top_bid + top_ask) / 2.0
-        quote_back = quote_after_s2 * mid  # VERY approximate
-        gross = quote_back / investment_quote
-        profit_pct = (gross - 1.0) * 100.0 - ESTIMATED_FEE_PCT
-        return (profit_pct >= MIN_PROFIT_PCT, profit_pct)
-    except Exception:
+        held, amount = _convert_leg(ob, pair_info[symbol], held, amount)
+        if held is None or amount <= 0:
+            return (False, 0.0)
+    if held != start:
         return (False, 0.0)
+    gross = amount / investment_quote
+    profit_pct = (gross - 1.0) * 100.0 - ESTIMATED_FEE_PCT
+    return (profit_pct >= MIN_PROFIT_PCT, profit_pct)
+
+async def fetch_prices(exchange: ccxta.Exchange, symbols: List[str]) -> Dict[str, dict]:
+    """
+    Build a top-of-book price map {symbol: {'bid', 'ask', 'mid'}} for symbols.
+    Uses one fetch_tickers request when the exchange supports it, per-symbol fetch_ticker otherwise
+    (including when the batch request fails).
+    """
+    # one request for the whole symbol list instead of one per symbol
+    batch = await safe_fetch_tickers(exchange, symbols) if exchange.has.get('fetchTickers') else None
+    if batch is not None:
+        tickers = [batch.get(s) for s in symbols]
+    else:
+        tickers = await asyncio.gather(*[safe_fetch_ticker(exchange, s) for s in symbols])
+    prices = {}
+    for s, t in zip(symbols, tickers):
+        if not t:
+            continue
+        bid = t.get('bid') or t.get('last') or 0
+        ask = t.get('ask') or t.get('last') or bid or 0
+        prices[s] = {'bid': bid, 'ask': ask, 'mid': (bid+ask)/2 if bid and ask else (t.get('last') or 0)}
+    return prices
+
+def passes_ticker_prefilter(p_a: dict, p_b: dict, min_edge_pct: float) -> bool:
+    """
+    Cheap cross-exchange candidate check on top-of-book quotes of the same symbol on two exchanges.
+    True if buying at one exchange's ask and selling at the other's bid clears min_edge_pct in either direction.
+    Top of book is the best price any depth fill can get, so symbols failing here cannot pass the depth check.
+    """
+    edge = min_edge_pct / 100.0
+    if p_a['ask'] > 0 and p_b['bid'] / p_a['ask'] - 1.0 >= edge:
+        return True
+    if p_b['ask'] > 0 and p_a['bid'] / p_b['ask'] - 1.0 >= edge:
+        return True
+    return False
+
+def _log_rate_matrix(prices: Dict[str, dict], pair_info: Dict[str, Tuple[str, str]], idx: Dict[str, int]) -> np.ndarray:
+    """
+    Dense top-of-book cost matrix over the currencies in idx: W[i, j] = -log(rate) for turning
+    currency i into currency j (buy at the ask, sell at the bid), inf where no listed pair connects them.
+    The entries of a cycle summing below zero mean the cycle is gross-profitable before depth and fees.
+    """
+    W = np.full((len(idx), len(idx)), np.inf)
+    for s, p in prices.items():
+        base, quote = pair_info[s]
+        if base not in idx or quote not in idx:
+            continue
+        if p['bid'] >= p['ask']:
+            # crossed or locked quote (often the 'last' fallback); it would form a bogus
+            # negative 2-cycle, so the pair is left out of the graph
+            continue
+        if p['ask'] > 0:
+            W[idx[quote], idx[base]] = math.log(p['ask'])
+        if p['bid'] > 0:
+            W[idx[base], idx[quote]] = -math.log(p['bid'])
+    return W
+
+def _trace_cycle(pred: np.ndarray, v: int) -> List[int]:
+    """
+    Follow Bellman-Ford predecessor links back from v into the cycle they lead to.
+    Returns the cycle's vertices in forward (edge) order, or [] if the chain ends before reaching one.
+    """
+    for _ in range(len(pred)):
+        v = pred[v]
+        if v < 0:
+            return []
+    cycle = [v]
+    u = pred[v]
+    while u != v:
+        if u < 0:
+            return []
+        cycle.append(u)
+        u = pred[u]
+    return cycle[::-1]
+
+def _bellman_ford_cycle(W: np.ndarray) -> List[int]:
+    """
+    One Bellman-Ford pass over the dense cost matrix W from a virtual source linked to every vertex.
+    Each relaxation round is a single vectorized pass over all n x n edges.
+    Returns one negative cycle (vertices in edge order), or [] if there is none.
+    """
+    n = W.shape[0]
+    cols = np.arange(n)
+    dist = np.zeros(n)
+    pred = np.full(n, -1)
+    for _ in range(n):
+        cand = dist[:, None] + W          # cand[u, v]: reach v through u
+        best_u = cand.argmin(axis=0)
+        best = cand[best_u, cols]
+        relaxed = best < dist - 1e-12
+        if not relaxed.any():
+            return []
+        dist[relaxed] = best[relaxed]
+        pred[relaxed] = best_u[relaxed]
+    # still relaxing on the n-th round: relaxed vertices lead back into a negative cycle
+    for v in np.flatnonzero(relaxed):
+        cycle = _trace_cycle(pred, int(v))
+        if cycle:
+            return [int(u) for u in cycle]
+    return []
+
+def find_negative_cycles(W: np.ndarray, min_legs: int = 3, max_legs: int = MAX_CYCLE_LEGS) -> List[List[int]]:
+    """
+    Enumerate negative cycles of W (see _log_rate_matrix) by repeated Bellman-Ford: after each cycle is found,
+    its costliest edge is blocked and the search reruns, until no negative cycle is left. Cycles outside
+    min_legs..max_legs are blocked the same way, so they cannot mask others. Returns the in-range cycles,
+    each rotated to start at its smallest index; a negative cycle is a gross-profitable round trip.
+    """
+    W = W.copy()
+    found = []
+    while True:
+        cycle = _bellman_ford_cycle(W)
+        if not cycle:
+            return found
+        legs = list(zip(cycle, cycle[1:] + cycle[:1]))
+        if min_legs <= len(cycle) <= max_legs:
+            first = cycle.index(min(cycle))
+            found.append(cycle[first:] + cycle[:first])
+        u, v = max(legs, key=lambda e: W[e])
+        W[u, v] = np.inf
+
+def _four_cycles(W: np.ndarray, threshold: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Every 4-leg cycle a->b->c->d->a of W whose cost is <= threshold, each listed once with a as its smallest index.
+    One vectorized n^3 pass per starting vertex, so no cycle can be masked the way repeated Bellman-Ford masks them.
+    """
+    n = W.shape[0]
+    cycles = []
+    for a in range(n - 3):
+        rest = np.arange(a + 1, n)
+        Wr = W[np.ix_(rest, rest)]
+        # cost[b, c, d] of a -> b -> c -> d -> a over the vertices above a
+        cost = W[a, rest][:, None, None] + Wr[:, :, None] + Wr[None, :, :] + W[rest, a][None, None, :]
+        for b, c, d in np.argwhere(cost <= threshold):
+            if b != d:  # b == c and c == d hit W's inf diagonal; b == d would revisit a currency
+                cycles.append((a, int(rest[b]), int(rest[c]), int(rest[d])))
+    return cycles
 
 # ---------------- Core scanning functions ----------------
 
-def scan_cross_exchanges(exchanges: Dict[str, ccxt.Exchange],
-                         investment: float = INVESTMENT_AMOUNT,
-                         min_profit_pct: float = MIN_PROFIT_PCT,
-                         fee_pct: float = ESTIMATED_FEE_PCT,
-                         depth_levels: int = ORDERBOOK_DEPTH_LEVELS,
-                         max_markets: int = MAX_MARKETS_PER_EXCHANGE) -> List[dict]:
+async def evaluate_both_directions(name_a: str, ex_a: ccxta.Exchange, name_b: str, ex_b: ccxta.Exchange,
+                                   symbol: str, investment_quote: float, depth_levels: int = 10,
+                                   min_profit_pct: float = MIN_PROFIT_PCT) -> List[dict]:
+    """
+    Fetch symbol's order book once on each exchange and evaluate buying on either one and selling on the other.
+    Returns 0-2 result rows, one per profitable direction; nothing is evaluated if either fetch fails.
+    """
+    ob_a, ob_b = await asyncio.gather(safe_fetch_order_book(ex_a, symbol, depth_levels),
+                                      safe_fetch_order_book(ex_b, symbol, depth_levels))
+    if not ob_a or not ob_b:
+        return []
     results = []
-    markets_by_ex = {}
-    # load markets for each exchange
-    for name, ex in exchanges.items():
-        markets_by_ex[name] = safe_load_markets(ex, limit=max_markets)
-    names = list(exchanges.keys())
-    for i in range(len(names)):
-        for j in range(i+1, len(names)):
-            a, b = names[i], names[j]
-            common = set(markets_by_ex[a].keys()) & set(markets_by_ex[b].keys())
-            for sym in list(common)[:500]:
-                feasible, profit_pct = check_cross_exchange_liquidity(exchanges[a], exchanges[b], sym, investment, depth_levels)
-                if feasible and profit_pct >= min_profit_pct:
-                    results.append({
-                        'pair': sym,
-                        'buy_exchange': a,
-                        'sell_exchange': b,
-                        'profit_percent': round(profit_pct,6)
-                    })
-                # reverse direction
-                feasible2, profit2 = check_cross_exchange_liquidity(exchanges[b], exchanges[a], sym, investment, depth_levels)
-                if feasible2 and profit2 >= min_profit_pct:
-                    results.append({
-                        'pair': sym,
-                        'buy_exchange': b,
-                        'sell_exchange': a,
-                        'profit_percent': round(profit2,6)
-                    })
+    for buy_name, sell_name, ob_buy, ob_sell in ((name_a, name_b, ob_a, ob_b), (name_b, name_a, ob_b, ob_a)):
+        feasible, profit_pct = check_cross_exchange_liquidity(ob_buy, ob_sell, investment_quote)
+        if feasible and profit_pct >= min_profit_pct:
+            results.append({
+                'pair': symbol,
+                'buy_exchange': buy_name,
+                'sell_exchange': sell_name,
+                'profit_percent': round(profit_pct,6)
+            })
     return results
 
-def scan_triangular_for_all(exchanges: Dict[str, ccxt.Exchange],
-                            min_profit_pct: float = MIN_PROFIT_PCT,
-                            fee_pct: float = ESTIMATED_FEE_PCT,
-                            depth_levels: int = ORDERBOOK_DEPTH_LEVELS,
-                            max_markets: int = MAX_MARKETS_PER_EXCHANGE) -> List[dict]:
+async def scan_cross_exchanges(exchanges: Dict[str, ccxta.Exchange],
+                               investment: float = INVESTMENT_AMOUNT,
+                               min_profit_pct: float = MIN_PROFIT_PCT,
+                               fee_pct: float = ESTIMATED_FEE_PCT,
+                               depth_levels: int = ORDERBOOK_DEPTH_LEVELS,
+                               max_markets: int = MAX_MARKETS_PER_EXCHANGE) -> List[dict]:
     results = []
-    for name, ex in exchanges.items():
-        markets = safe_load_markets(ex, limit=max_markets)
-        symbols = [s for s in markets.keys() if '/' in s]
-        # build price map (mid/bid/ask) for present symbols
-        prices = {}
-        for s in symbols[:max_markets]:
-            t = safe_fetch_ticker(ex, s)
-            if not t:
-                continue
-            bid = t.get('bid') or t.get('last') or 0
-            ask = t.get('ask') or t.get('last') or bid or 0
-            prices[s] = {'bid': bid, 'ask': ask, 'mid': (bid+ask)/2 if bid and ask else (t.get('last') or 0)}
-        # gather currencies
-        currencies = set()
-        for s in prices.keys():
-            try:
-                a,b = s.split('/')
-                currencies.add(a); currencies.add(b)
-            except Exception:
+    # load markets for each exchange concurrently
+    names = list(exchanges.keys())
+    loaded = await asyncio.gather(*[safe_load_markets(exchanges[name], limit=max_markets) for name in names])
+    markets_by_ex = dict(zip(names, loaded))
+    # one tickers snapshot per exchange drives a cheap prefilter, so order books are only
+    # fetched for symbols whose top-of-book spread could clear profit + fees
+    batched = [name for name in names if exchanges[name].has.get('fetchTickers')]
+    snapshots = await asyncio.gather(*[fetch_prices(exchanges[name], list(markets_by_ex[name].keys()))
+                                       for name in batched])
+    prices_by_ex = dict(zip(batched, snapshots))
+    min_edge_pct = min_profit_pct + fee_pct - TICKER_PREFILTER_SLACK_PCT
+    # hash each exchange's symbol set once and index symbols by the exchanges listing them,
+    # so the work is O(symbols * exchanges per symbol) instead of one set intersection per pair
+    key_sets = {name: frozenset(m.keys()) for name, m in markets_by_ex.items()}
+    symbol_to_exchanges: Dict[str, List[str]] = defaultdict(list)
+    for name in names:
+        for sym in key_sets[name]:
+            symbol_to_exchanges[sym].append(name)
+    candidates = []
+    per_pair = Counter()
+    # sorted once so the per-pair cap keeps the same symbols on every run
+    for sym in sorted(symbol_to_exchanges):
+        for a, b in combinations(symbol_to_exchanges[sym], 2):
+            if per_pair[(a, b)] >= 500:
                 continue
-        currencies = list(currencies)[:80]
-        # naive triangular combos
-        for i in range(len(currencies)):
-            for j in range(len(currencies)):
-                for k in range(len(currencies)):
-                    if i==j or j==k or i==k:
-                        continue
-                    A = currencies[i]; B = currencies[j]; C = currencies[k]
-                    s1 = f"{A}/{B}"; s2 = f"{B}/{C}"; s3 = f"{C}/{A}"
-                    if s1 in prices and s2 in prices and s3 in prices:
-                        # perform depth-aware simulation
-                        feasible, profit_pct = simulate_triangular_with_depth(ex, (s1,s2,s3), INVESTMENT_AMOUNT, depth_levels)
-                        if feasible and profit_pct >= min_profit_pct:
-                            results.append({
-                                'exchange': name,
-                                'route': f"{A}->{B}->{C}->{A}",
-                                'profit_percent': round(profit_pct,6)
-                            })
+            per_pair[(a, b)] += 1
+            if a in prices_by_ex and b in prices_by_ex:
+                pa, pb = prices_by_ex[a], prices_by_ex[b]
+                # symbols missing from a snapshot are kept rather than silently dropped
+                if sym in pa and sym in pb and not passes_ticker_prefilter(pa[sym], pb[sym], min_edge_pct):
+                    continue
+            candidates.append((sym, a, b))
+    # both directions of every candidate are evaluated concurrently; the order-book cache lets
+    # candidates that share an (exchange, symbol) book share its fetch
+    evaluated = await asyncio.gather(*[evaluate_both_directions(a, exchanges[a], b, exchanges[b], sym, investment,
+                                                                depth_levels, min_profit_pct)
+                                       for sym, a, b in candidates], return_exceptions=True)
+    for rows in evaluated:
+        if not isinstance(rows, BaseException):
+            results.extend(rows)
     return results
 
+def _cycle_candidates(prices: Dict[str, dict], pair_info: Dict[str, Tuple[str, str]], currencies: List[str],
+                      symbol_of: Dict[Tuple[str, str], str], quote_count: Counter,
+                      threshold: float) -> List[Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+    """
+    Candidate routes [(currency_path, symbols)] whose top-of-book cost clears threshold.
+    3- and 4-leg routes are listed exhaustively; longer ones (up to MAX_CYCLE_LEGS) come from find_negative_cycles.
+    Each path starts at its most quote-like currency; each leg trades whichever way its market is listed.
+    """
+    idx = {cur: i for i, cur in enumerate(currencies)}
+    W = _log_rate_matrix(prices, pair_info, idx)
+    finite = np.isfinite(W)
+    # list each realizable triangle once (A < B < C) as a combination of A's higher neighbors.
+    # A cycle and its rotations share one gross rate, so each triangle is scored once per direction
+    cycles = []
+    for a in range(len(currencies)):
+        higher = [b for b in np.flatnonzero(finite[a]) if b > a]
+        for b, c in combinations(higher, 2):
+            if finite[b, c]:
+                cycles.append((a, b, c))
+                cycles.append((a, c, b))
+    if cycles:
+        I, J, K = np.array(cycles).T
+        cost = W[I, J] + W[J, K] + W[K, I]
+        cycles = [cycles[r] for r in np.flatnonzero(cost <= threshold)]
+    if MAX_CYCLE_LEGS >= 4:
+        cycles.extend(_four_cycles(W, threshold))
+    if MAX_CYCLE_LEGS >= 5:
+        for cycle in find_negative_cycles(W, 5, MAX_CYCLE_LEGS):
+            if sum(W[u, v] for u, v in zip(cycle, cycle[1:] + cycle[:1])) <= threshold:
+                cycles.append(tuple(cycle))
+    routes = []
+    for cycle in cycles:
+        path = [currencies[i] for i in cycle]
+        first = max(range(len(path)), key=lambda i: quote_count[path[i]])
+        path = tuple(path[first:] + path[:first])
+        routes.append((path, tuple(symbol_of[(a, b)] for a, b in zip(path, path[1:] + path[:1]))))
+    return routes
+
+async def scan_triangular_for_exchange(name: str, ex: ccxta.Exchange,
+                                       min_profit_pct: float = MIN_PROFIT_PCT,
+                                       fee_pct: float = ESTIMATED_FEE_PCT,
+                                       depth_levels: int = ORDERBOOK_DEPTH_LEVELS,
+                                       max_markets: int = MAX_MARKETS_PER_EXCHANGE) -> List[dict]:
+    results = []
+    markets = await safe_load_markets(ex, limit=max_markets)
+    # (base, quote) of every spot market, taken once from the load_markets metadata
+    pair_info = {s: (m['base'], m['quote']) for s, m in markets.items()
+                 if m.get('spot', True) and m.get('base') and m.get('quote')}
+    symbols = list(pair_info.keys())
+    # build price map (mid/bid/ask) for present symbols
+    prices = await fetch_prices(ex, symbols[:max_markets])
+    # gather currencies and index each symbol under both orderings of its currency pair
+    market_count = Counter()
+    symbol_of = {}
+    for s in prices.keys():
+        a, b = pair_info[s]
+        market_count[a] += 1; market_count[b] += 1
+        symbol_of.setdefault((a, b), s); symbol_of.setdefault((b, a), s)
+    # keep the 80 best-connected currencies (hubs such as USDT/BTC first, ties by name)
+    currencies = sorted(market_count, key=lambda c: (-market_count[c], c))[:80]
+    # how many markets each currency quotes; routes start from the cycle's most quote-like
+    # member, the one INVESTMENT_AMOUNT is most plausibly denominated in
+    quote_count = Counter(pair_info[s][1] for s in prices)
+    threshold = -math.log(1 + (min_profit_pct + fee_pct) / 100.0)
+    # candidate generation is pure NumPy/Python work; keep it off the event loop so the other
+    # exchanges' scans keep fetching meanwhile
+    routes = await asyncio.to_thread(_cycle_candidates, prices, pair_info, currencies, symbol_of,
+                                     quote_count, threshold)
+    # perform depth-aware simulations concurrently
+    sims = await asyncio.gather(*[simulate_triangular_with_depth(ex, route, path[0], pair_info,
+                                                                 INVESTMENT_AMOUNT, depth_levels)
+                                  for path, route in routes], return_exceptions=True)
+    for (path, _), sim in zip(routes, sims):
+        if isinstance(sim, BaseException):
+            continue
+        feasible, profit_pct = sim
+        if feasible and profit_pct >= min_profit_pct:
+            results.append({
+                'exchange': name,
+                'route': "->".join(path + path[:1]),
+                'profit_percent': round(profit_pct,6)
+            })
+    return results
+
+async def scan_triangular_for_all(exchanges: Dict[str, ccxta.Exchange],
+                                  min_profit_pct: float = MIN_PROFIT_PCT,
+                                  fee_pct: float = ESTIMATED_FEE_PCT,
+                                  depth_levels: int = ORDERBOOK_DEPTH_LEVELS,
+                                  max_markets: int = MAX_MARKETS_PER_EXCHANGE) -> List[dict]:
+    # every exchange has its own rate-limit bucket, so scan them concurrently:
+    # total time is the slowest exchange rather than the sum
+    per_exchange = await asyncio.gather(*[
+        scan_triangular_for_exchange(name, ex, min_profit_pct, fee_pct, depth_levels, max_markets)
+        for name, ex in exchanges.items()])
+    return list(chain.from_iterable(per_exchange))
+
 # ----------------- CLI demo runner -----------------
 
-def main():
+def save_csv(rows: List[dict], path: str) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+async def main():
+    # One keep-alive connection pool shared by every exchange client, so TLS handshakes and
+    # DNS lookups are paid once per host instead of once per client
+    connector = aiohttp.TCPConnector(limit=200, limit_per_host=30, ttl_dns_cache=300, enable_cleanup_closed=True)
+    session = aiohttp.ClientSession(connector=connector)
     # Initialize exchanges (DEFAULT_EXCHANGES by default)
     exchanges = {}
     for name in DEFAULT_EXCHANGES:
         try:
-            ex = init_exchange(name)
+            ex = init_exchange(name, session=session)
             exchanges[name] = ex
             print(f"[info] initialized {name}")
         except Exception as e:
             print(f"[warn] failed to init {name}: {e}")
 
-    print("[info] scanning triangular opportunities (depth-aware)...")
-    t0 = time.time()
-    tri = scan_triangular_for_all(exchanges)
-    t1 = time.time()
-    print(f"[info] triangular scan finished in {round(t1-t0,2)}s, results: {len(tri)}")
-    if tri:
-        df_tri = pd.DataFrame(tri).sort_values(by='profit_percent', ascending=False)
-        print(df_tri.head(50).to_string(index=False))
-        df_tri.to_csv("triangular_opportunities_depth.csv", index=False)
-        print("[info] saved triangular_opportunities_depth.csv")
-    else:
-        print("[info] no triangular opportunities found.")
-
-    print("[info] scanning cross-exchange opportunities (depth-aware)...")
-    t2 = time.time()
-    cross = scan_cross_exchanges(exchanges)
-    t3 = time.time()
-    print(f"[info] cross-exchange scan finished in {round(t3-t2,2)}s, results: {len(cross)}")
-    if cross:
-        df_cross = pd.DataFrame(cross).sort_values(by='profit_percent', ascending=False)
-        print(df_cross.head(50).to_string(index=False))
-        df_cross.to_csv("cross_exchange_opportunities_depth.csv", index=False)
-        print("[info] saved cross_exchange_opportunities_depth.csv")
-    else:
-        print("[info] no cross-exchange opportunities found.")
+    try:
+        print("[info] scanning triangular opportunities (depth-aware)...")
+        t0 = time.time()
+        tri = await scan_triangular_for_all(exchanges)
+        t1 = time.time()
+        print(f"[info] triangular scan finished in {round(t1-t0,2)}s, results: {len(tri)}")
+        if tri:
+            import pandas as pd  # only needed to render results; skipped entirely on empty scans
+            top = heapq.nlargest(50, tri, key=operator.itemgetter('profit_percent'))
+            print(pd.DataFrame.from_records(top, columns=['exchange', 'route', 'profit_percent']).to_string(index=False))
+            save_csv(tri, "triangular_opportunities_depth.csv")
+            print("[info] saved triangular_opportunities_depth.csv")
+        else:
+            print("[info] no triangular opportunities found.")
+
+        print("[info] scanning cross-exchange opportunities (depth-aware)...")
+        t2 = time.time()
+        cross = await scan_cross_exchanges(exchanges)
+        t3 = time.time()
+        print(f"[info] cross-exchange scan finished in {round(t3-t2,2)}s, results: {len(cross)}")
+        if cross:
+            import pandas as pd
+            top = heapq.nlargest(50, cross, key=operator.itemgetter('profit_percent'))
+            print(pd.DataFrame.from_records(top, columns=['pair', 'buy_exchange', 'sell_exchange', 'profit_percent'])
+                  .to_string(index=False))
+            save_csv(cross, "cross_exchange_opportunities_depth.csv")
+            print("[info] saved cross_exchange_opportunities_depth.csv")
+        else:
+            print("[info] no cross-exchange opportunities found.")
+    finally:
+        # release the async ccxt clients, then the shared session they borrowed
+        await asyncio.gather(*[ex.close() for ex in exchanges.values()], return_exceptions=True)
+        await session.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())